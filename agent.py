@@ -2,33 +2,21 @@
 Agent module that handles function calling with Ollama.
 This enables the LLM to automatically decide when to use tools based on the prompt.
 """
-import requests
-import json
+import asyncio
+import httpx
+import orjson
 from typing import Any, Dict, List, Optional
-import yaml
-import os
 import logging
 
+from config import get_config
+from http_client import get_client
 from web_tools import reddit_search, web_fetch
 
 logger = logging.getLogger("genie")
 
-# Load config
-def load_config():
-    config_path = "config.yaml"
-    if os.path.exists(config_path):
-        try:
-            with open(config_path, "r") as f:
-                config = yaml.safe_load(f)
-                return config
-        except Exception as e:
-            logger.warning(f"Failed to load config.yaml: {e}, using defaults")
-    return {}
-
-_config = load_config()
-OLLAMA_CHAT_URL = _config.get("ollama_chat_url", "http://localhost:11434/api/chat")
-MODEL = _config.get("model", "qwen2.5:7b-instruct")
-TIMEOUT = _config.get("timeout", 60)
+DEFAULT_OLLAMA_CHAT_URL = "http://localhost:11434/api/chat"
+DEFAULT_MODEL = "qwen2.5:7b-instruct"
+DEFAULT_TIMEOUT = 60
 
 # Define available tools for the LLM
 TOOLS = [
@@ -73,52 +61,83 @@ TOOLS = [
     }
 ]
 
+# TOOLS never changes at runtime; serialize it once so the agent loop
+# concatenates bytes instead of re-encoding the whole schema every call.
+_TOOLS_JSON = orjson.dumps(TOOLS)
+
+# Shared read-only system message: every request reuses the same dict
+# instead of rebuilding it (it is only ever serialized, never mutated).
+_SYSTEM_MESSAGE = {
+    "role": "system",
+    "content": "You are a helpful assistant with access to tools. When users ask you to search, fetch, or retrieve information from the web or Reddit, use the appropriate tools."
+}
+
 # Tool execution functions
 TOOL_FUNCTIONS = {
     "reddit_search": lambda args: reddit_search(args.get("query", ""), args.get("limit", 5)),
     "web_fetch": lambda args: web_fetch(args.get("url", ""))
 }
 
-def execute_tool(tool_name: str, arguments: Dict[str, Any]) -> Any:
+# Bounds on the conversation re-sent to Ollama each iteration: prefill cost
+# is linear in prompt length, and old tool outputs dominate it after a few
+# turns without improving answers.
+_HISTORY_KEEP_LAST = 12
+_MAX_TOOL_RESULT_CHARS = 1000
+
+def _trim_history(messages: List[Dict[str, str]]) -> List[Dict[str, str]]:
+    """Drop middle turns once the history grows past the cap, keeping the
+    system prompt and the first user message plus the most recent turns."""
+    if len(messages) <= _HISTORY_KEEP_LAST:
+        return messages
+    head = messages[:2]
+    return head + messages[-(_HISTORY_KEEP_LAST - len(head)):]
+
+async def execute_tool(tool_name: str, arguments: Dict[str, Any]) -> Any:
     """Execute a tool function with the provided arguments."""
     if tool_name not in TOOL_FUNCTIONS:
         raise ValueError(f"Unknown tool: {tool_name}")
-    
+
     logger.info(f"Executing tool: {tool_name} with args: {arguments}")
     try:
-        result = TOOL_FUNCTIONS[tool_name](arguments)
+        result = await TOOL_FUNCTIONS[tool_name](arguments)
         return result
     except Exception as e:
         logger.error(f"Tool execution failed: {e}")
         return {"error": str(e)}
 
-def chat_with_tools(messages: List[Dict[str, str]], max_iterations: int = 5) -> str:
+async def chat_with_tools(messages: List[Dict[str, str]], max_iterations: int = 5) -> str:
     """
     Chat with Ollama using function calling.
     Handles the agent loop: LLM decides to call tools, tools execute, results fed back.
     """
+    config = get_config()
+    ollama_chat_url = config.get("ollama_chat_url", DEFAULT_OLLAMA_CHAT_URL)
+    model = config.get("model", DEFAULT_MODEL)
+    timeout = config.get("timeout", DEFAULT_TIMEOUT)
+    # The model/tools prefix is identical for every iteration; build it once
+    # so only the growing messages list is serialized per call.
+    body_prefix = (b'{"model":' + orjson.dumps(model)
+                   + b',"tools":' + _TOOLS_JSON
+                   + b',"messages":')
     iterations = 0
-    
+
     while iterations < max_iterations:
         iterations += 1
-        
-        # Prepare the request to Ollama
-        request_data = {
-            "model": MODEL,
-            "messages": messages,
-            "tools": TOOLS,
-            "stream": False
-        }
-        
+
+        # Prepare the request to Ollama as raw bytes, skipping httpx's
+        # internal JSON encode of the constant tool schema.
+        body = body_prefix + orjson.dumps(messages) + b',"stream":false}'
+
         try:
-            response = requests.post(
-                OLLAMA_CHAT_URL,
-                json=request_data,
-                timeout=TIMEOUT
+            response = await get_client().post(
+                ollama_chat_url,
+                content=body,
+                headers={"Content-Type": "application/json"},
+                timeout=timeout
             )
             response.raise_for_status()
-            data = response.json()
-        except requests.RequestException as e:
+            data = orjson.loads(response.content)
+        except httpx.HTTPError as e:
             raise RuntimeError(f"Ollama request failed: {e}")
         
         # Extract the assistant's message
@@ -126,66 +145,82 @@ def chat_with_tools(messages: List[Dict[str, str]], max_iterations: int = 5) ->
         content = assistant_message.get("content", "")
         tool_calls = assistant_message.get("tool_calls", [])
         
-        # Add assistant's response to messages
-        messages.append({
-            "role": "assistant",
-            "content": content,
-            "tool_calls": tool_calls if tool_calls else None
-        })
+        # Add assistant's response to messages. The history is append-only
+        # with a fixed key order (role, content, tool_calls) and past
+        # messages are never mutated, so together with the pre-built
+        # model/tools prefix the serialized request is byte-identical up to
+        # the new suffix on every iteration — letting Ollama's prompt cache
+        # skip re-prefilling the shared prefix.
+        assistant_entry = {"role": "assistant", "content": content}
+        if tool_calls:
+            assistant_entry["tool_calls"] = tool_calls
+        messages.append(assistant_entry)
         
         # If no tool calls, we're done - return the final answer
         if not tool_calls:
             return content
         
-        # Execute tools and add results to messages
-        tool_results = []
+        # Parse tool calls, then execute them concurrently: when the LLM
+        # emits N tool calls in one turn, total latency is the slowest
+        # call rather than the sum of all of them.
+        parsed_calls = []
         for tool_call in tool_calls:
-            tool_name = tool_call.get("function", {}).get("name")
-            tool_args_raw = tool_call.get("function", {}).get("arguments", "{}")
-            
-            # Parse arguments (Ollama sometimes returns string, sometimes dict)
-            if isinstance(tool_args_raw, str):
+            function = tool_call.get("function", {})
+            tool_name = function.get("name")
+            tool_args = function.get("arguments", "{}")
+
+            # Fast path: current Ollama builds return a dict here, already
+            # decoded from response.content — use it as-is. Only older
+            # builds hand back a JSON string needing a second parse.
+            # type() is an exact check, cheaper than isinstance on this
+            # hot two-way branch.
+            if type(tool_args) is str:
                 try:
-                    tool_args = json.loads(tool_args_raw)
-                except json.JSONDecodeError:
-                    logger.warning(f"Failed to parse tool arguments: {tool_args_raw}")
+                    tool_args = orjson.loads(tool_args)
+                except orjson.JSONDecodeError:
+                    logger.warning(f"Failed to parse tool arguments: {tool_args}")
                     tool_args = {}
-            else:
-                tool_args = tool_args_raw
-            
-            # Execute the tool
-            tool_result = execute_tool(tool_name, tool_args)
-            
-            # Add tool result to messages
-            tool_results.append({
+            parsed_calls.append((tool_name, tool_args))
+
+        results = await asyncio.gather(
+            *(execute_tool(name, args) for name, args in parsed_calls),
+            return_exceptions=True,
+        )
+
+        # Add tool results to messages for next iteration, truncated so a
+        # single huge result doesn't blow up every later prompt
+        for (tool_name, _), tool_result in zip(parsed_calls, results):
+            if isinstance(tool_result, BaseException):
+                logger.error(f"Tool execution failed: {tool_result}")
+                tool_result = {"error": str(tool_result)}
+            content = orjson.dumps(tool_result, default=str).decode()
+            if len(content) > _MAX_TOOL_RESULT_CHARS:
+                content = content[:_MAX_TOOL_RESULT_CHARS] + "...[truncated]"
+            messages.append({
                 "role": "tool",
-                "content": json.dumps(tool_result, default=str),
+                "content": content,
                 "name": tool_name
             })
-        
-        # Add tool results to messages for next iteration
-        messages.extend(tool_results)
+
+        messages = _trim_history(messages)
         
         # Continue the loop to let LLM process tool results
     
     # If we hit max iterations, return what we have
     return messages[-1].get("content", "Maximum iterations reached. Please try again.")
 
-def ask_with_tools(prompt: str) -> str:
+async def ask_with_tools(prompt: str) -> str:
     """
     Ask the LLM a question with automatic tool use.
     The LLM will decide whether to use tools based on the prompt.
     """
     messages = [
-        {
-            "role": "system",
-            "content": "You are a helpful assistant with access to tools. When users ask you to search, fetch, or retrieve information from the web or Reddit, use the appropriate tools."
-        },
+        _SYSTEM_MESSAGE,
         {
             "role": "user",
             "content": prompt
         }
     ]
     
-    return chat_with_tools(messages)
+    return await chat_with_tools(messages)
 
@@ -0,0 +1,72 @@
+"""
+Shared config loader with caching.
+
+agent.py and llm.py previously each parsed config.yaml at import time.
+get_config() stats the file and only re-parses when its mtime or size
+changes, so a single parse serves the whole process.
+
+Parsed config is also mirrored to a .config.json sidecar: on the common
+path (config.yaml unchanged between runs) the sidecar is newer, so the
+file is read with the C json parser and PyYAML is never even imported.
+"""
+import functools
+import json
+import logging
+import os
+
+logger = logging.getLogger("genie")
+
+CONFIG_PATH = "config.yaml"
+SIDECAR_PATH = ".config.json"
+
+
+def _sidecar_fresh(yaml_mtime: float) -> bool:
+    try:
+        return os.path.getmtime(SIDECAR_PATH) >= yaml_mtime
+    except OSError:
+        return False
+
+
+@functools.lru_cache(maxsize=1)
+def _read_config(path: str, mtime_ns: int, size: int) -> dict:
+    # mtime_ns/size are part of the cache key: a changed file misses the
+    # cache and triggers a fresh parse.
+    if _sidecar_fresh(mtime_ns / 1e9):
+        try:
+            with open(SIDECAR_PATH, "rb") as f:
+                return json.loads(f.read())
+        except (OSError, ValueError) as e:
+            logger.warning(f"Failed to load {SIDECAR_PATH}: {e}, re-parsing yaml")
+
+    # Sidecar stale or unreadable: fall back to PyYAML (imported lazily so
+    # the common path never pays its import cost) and refresh the sidecar.
+    try:
+        import yaml
+        with open(path, "r") as f:
+            config = yaml.safe_load(f) or {}
+    except Exception as e:
+        logger.warning(f"Failed to load {path}: {e}, using defaults")
+        return {}
+
+    # default=str covers YAML-only types like dates; a failed dump must
+    # never break config loading, and a half-written sidecar is removed so
+    # it can't shadow the yaml as a newer-but-corrupt copy.
+    try:
+        with open(SIDECAR_PATH, "w") as f:
+            json.dump(config, f, default=str)
+    except (OSError, TypeError, ValueError) as e:
+        logger.warning(f"Failed to write {SIDECAR_PATH}: {e}")
+        try:
+            os.remove(SIDECAR_PATH)
+        except OSError:
+            pass
+    return config
+
+
+def get_config() -> dict:
+    """Return the parsed config, re-reading only when the file changed."""
+    try:
+        st = os.stat(CONFIG_PATH)
+    except OSError:
+        return {}
+    return _read_config(CONFIG_PATH, st.st_mtime_ns, st.st_size)
@@ -0,0 +1,38 @@
+"""
+Shared async HTTP client.
+
+All outbound HTTP (Reddit, arbitrary web fetches, the Ollama endpoints) goes
+through one httpx.AsyncClient so requests run on the event loop instead of
+blocking threadpool workers, keep-alive connections are reused across calls,
+and HTTP/2 multiplexing is available where the server supports it.
+
+The client is created lazily so importing this module has no side effects;
+server.py closes it on shutdown via aclose_client().
+"""
+import httpx
+
+_client = None
+
+
+def get_client() -> httpx.AsyncClient:
+    """Return the shared AsyncClient, creating it on first use."""
+    global _client
+    if _client is None or _client.is_closed:
+        # http2/limits must go on the transport: client-level values are
+        # ignored whenever a custom transport is passed.
+        _client = httpx.AsyncClient(
+            transport=httpx.AsyncHTTPTransport(
+                http2=True,
+                retries=2,
+                limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+            ),
+        )
+    return _client
+
+
+async def aclose_client() -> None:
+    """Close the shared client (called on server shutdown)."""
+    global _client
+    if _client is not None and not _client.is_closed:
+        await _client.aclose()
+    _client = None
@@ -1,27 +1,16 @@
-import requests
-from typing import Any
-import yaml
-import os
+import httpx
+import orjson
+from typing import Any, AsyncIterator
 import logging
 
-logger = logging.getLogger("genie")
+from config import get_config
+from http_client import get_client
 
-# Load config if available, otherwise use defaults
-def load_config():
-    config_path = "config.yaml"
-    if os.path.exists(config_path):
-        try:
-            with open(config_path, "r") as f:
-                config = yaml.safe_load(f)
-                return config
-        except Exception as e:
-            logger.warning(f"Failed to load config.yaml: {e}, using defaults")
-    return {}
+logger = logging.getLogger("genie")
 
-_config = load_config()
-OLLAMA_URL = _config.get("ollama_url", "http://localhost:11434/api/generate")
-MODEL = _config.get("model", "qwen2.5:7b-instruct")
-TIMEOUT = _config.get("timeout", 60)
+DEFAULT_OLLAMA_URL = "http://localhost:11434/api/generate"
+DEFAULT_MODEL = "qwen2.5:7b-instruct"
+DEFAULT_TIMEOUT = 60
 
 def _extract_text(resp_json: Any) -> str:
     # Guard against different possible response shapes
@@ -39,20 +28,21 @@ def _extract_text(resp_json: Any) -> str:
     # Fallbacks
     return resp_json.get("text", "") or ""
 
-def ask_qwen(prompt: str) -> str:
+async def ask_qwen(prompt: str) -> str:
+    config = get_config()
     try:
-        r = requests.post(
-            OLLAMA_URL,
-            json={"model": MODEL, "prompt": prompt, "stream": False},
-            timeout=TIMEOUT,
+        r = await get_client().post(
+            config.get("ollama_url", DEFAULT_OLLAMA_URL),
+            json={"model": config.get("model", DEFAULT_MODEL), "prompt": prompt, "stream": False},
+            timeout=config.get("timeout", DEFAULT_TIMEOUT),
         )
         r.raise_for_status()
-    except requests.RequestException as e:
+    except httpx.HTTPError as e:
         raise RuntimeError(f"Ollama request failed: {e}")
 
     try:
-        data = r.json()
-    except ValueError:
+        data = orjson.loads(r.content)
+    except orjson.JSONDecodeError:
         raise RuntimeError("Ollama returned non-JSON response")
 
     text = _extract_text(data)
@@ -62,3 +52,34 @@ def ask_qwen(prompt: str) -> str:
     return text
 
 
+async def stream_qwen(prompt: str) -> AsyncIterator[str]:
+    """
+    Stream completion text from Ollama as it is generated.
+    Ollama emits NDJSON lines like {"response": "...", "done": false};
+    yield each text fragment so callers can forward it immediately
+    instead of waiting for the full completion.
+    """
+    config = get_config()
+    try:
+        async with get_client().stream(
+            "POST",
+            config.get("ollama_url", DEFAULT_OLLAMA_URL),
+            json={"model": config.get("model", DEFAULT_MODEL), "prompt": prompt, "stream": True},
+            timeout=config.get("timeout", DEFAULT_TIMEOUT),
+        ) as r:
+            r.raise_for_status()
+            async for line in r.aiter_lines():
+                if not line:
+                    continue
+                try:
+                    chunk = orjson.loads(line)
+                except orjson.JSONDecodeError:
+                    logger.warning(f"Skipping non-JSON stream line from Ollama: {line[:200]}")
+                    continue
+                text = chunk.get("response")
+                if text:
+                    yield text
+                if chunk.get("done"):
+                    break
+    except httpx.HTTPError as e:
+        raise RuntimeError(f"Ollama request failed: {e}")
@@ -1,27 +1,59 @@
+import asyncio
+from contextlib import asynccontextmanager
+from typing import List
 from fastapi import FastAPI, HTTPException, Query
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from pydantic import BaseModel, HttpUrl
-from llm import ask_qwen
+from llm import ask_qwen, stream_qwen
 from agent import ask_with_tools
 from web_tools import reddit_search, web_fetch
+from http_client import aclose_client
 import logging
+import queue
 import sys
+from logging.handlers import QueueHandler, QueueListener
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(sys.stdout),
-        logging.FileHandler('genie.log')
-    ]
-)
+# Configure logging. Request-path log calls only enqueue the record; a
+# background QueueListener owns the FileHandler, so disk flushes never
+# stall the event loop. The QueueHandler must stay unformatted (its
+# prepare() would bake the formatted line into the record, and the file
+# handler would then format it a second time), so the formatter is set
+# explicitly on the stdout and file handlers only.
+_log_format = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+_log_queue = queue.Queue(-1)
+_file_handler = logging.FileHandler('genie.log')
+_file_handler.setFormatter(_log_format)
+_log_listener = QueueListener(_log_queue, _file_handler)
 
-app = FastAPI(title="Genie Local API")
+_stream_handler = logging.StreamHandler(sys.stdout)
+_stream_handler.setFormatter(_log_format)
+
+_root_logger = logging.getLogger()
+_root_logger.setLevel(logging.INFO)
+_root_logger.addHandler(_stream_handler)
+_root_logger.addHandler(QueueHandler(_log_queue))
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    _log_listener.start()
+    try:
+        yield
+    finally:
+        # Drain pending log records, then close the shared HTTP client so
+        # pooled connections shut down cleanly
+        _log_listener.stop()
+        await aclose_client()
+
+app = FastAPI(title="Genie Local API", lifespan=lifespan, default_response_class=ORJSONResponse)
 
 logger = logging.getLogger("genie")
 
 class FetchRequest(BaseModel):
     url: HttpUrl
+    raw: bool = False  # return unprocessed body instead of extracted text
+
+class BatchRequest(BaseModel):
+    prompts: List[str]
 
 @app.get("/")
 def root():
@@ -29,42 +61,93 @@ def root():
     return {"status": "ok", "service": "Genie Local API"}
 
 @app.get("/search_reddit")
-def search_reddit(query: str = Query(..., min_length=1)):
+async def search_reddit(query: str = Query(..., min_length=1), nocache: bool = Query(False, description="Bypass the result cache")):
     try:
-        posts = reddit_search(query)
+        posts = await reddit_search(query, use_cache=not nocache)
         return {"query": query, "results": posts}
     except Exception as e:
         logger.exception("reddit_search failed")
         raise HTTPException(status_code=502, detail=str(e))
 
 @app.post("/fetch_url")
-def fetch_url(req: FetchRequest):
+async def fetch_url(req: FetchRequest):
     try:
-        content = web_fetch(str(req.url))
-        return {"url": str(req.url), "content": content[:4000]}
+        # The 4000-char cap lives inside web_fetch so it stops fetching and
+        # decoding once it has enough bytes, instead of trimming afterwards
+        content = await web_fetch(str(req.url), raw=req.raw, max_chars=4000)
+        return {"url": str(req.url), "content": content}
     except Exception as e:
         logger.exception("fetch_url failed")
         raise HTTPException(status_code=502, detail=str(e))
 
 @app.get("/ask")
-def ask(prompt: str = Query(..., min_length=1), use_tools: bool = Query(True, description="Enable automatic tool use")):
+async def ask(prompt: str = Query(..., min_length=1), use_tools: bool = Query(True, description="Enable automatic tool use")):
     """
-    Ask the LLM a question. 
+    Ask the LLM a question. The answer is streamed as plain text chunks so
+    the first tokens arrive as soon as Ollama generates them.
     With use_tools=True (default), the LLM can automatically use Reddit search and web fetch tools.
     With use_tools=False, it just queries the LLM directly without tools.
     """
     try:
         if use_tools:
-            resp = ask_with_tools(prompt)
+            # Ollama's tool-call output is not incremental, so the agent loop
+            # runs non-streamed and the final answer is sent as one chunk.
+            resp = await ask_with_tools(prompt)
+
+            async def generate():
+                yield resp
         else:
-            resp = ask_qwen(prompt)
-        return {"response": resp, "tools_used": use_tools}
+            gen = stream_qwen(prompt)
+            # Pull the first chunk eagerly so connection errors surface as a
+            # 502 instead of a broken 200 stream.
+            first = await anext(gen)
+
+            async def generate():
+                yield first
+                async for chunk in gen:
+                    yield chunk
+        return StreamingResponse(generate(), media_type="text/event-stream")
+    except StopAsyncIteration:
+        logger.warning("ask produced no output")
+        raise HTTPException(status_code=502, detail="Ollama returned empty response")
     except Exception as e:
         logger.exception("ask failed")
         raise HTTPException(status_code=502, detail=str(e))
 
+@app.post("/ask_batch")
+async def ask_batch(req: BatchRequest):
+    """
+    Answer several prompts in one call. The prompts are sent to Ollama
+    concurrently over the shared client so its in-flight batcher can group
+    them into shared forward passes (run Ollama with OLLAMA_NUM_PARALLEL>1
+    to benefit). Failed prompts return an error entry instead of failing
+    the whole batch.
+    """
+    if not req.prompts:
+        raise HTTPException(status_code=422, detail="prompts must not be empty")
+    results = await asyncio.gather(
+        *(ask_qwen(p) for p in req.prompts), return_exceptions=True
+    )
+    responses = []
+    for prompt, result in zip(req.prompts, results):
+        if isinstance(result, BaseException):
+            logger.error(f"ask_batch prompt failed: {result}")
+            responses.append({"prompt": prompt, "error": str(result)})
+        else:
+            responses.append({"prompt": prompt, "response": result})
+    return {"responses": responses}
+
 if __name__ == "__main__":
+    import os
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
-
-
+    # uvloop and httptools (bundled with uvicorn[standard]) replace the
+    # default event loop and HTTP parser with C implementations; the app is
+    # passed as an import string because workers>1 requires it.
+    uvicorn.run(
+        "server:app",
+        host="0.0.0.0",
+        port=8000,
+        loop="uvloop",
+        http="httptools",
+        workers=os.cpu_count(),
+    )
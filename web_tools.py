@@ -1,33 +1,88 @@
-import requests
-from requests.utils import quote
+import asyncio
+import functools
+import httpx
 import logging
+import re
+import socket
+import time
 from urllib.parse import urlparse
 from ipaddress import ip_address
+from cachetools import TTLCache
+from selectolax.parser import HTMLParser
+
+from http_client import get_client
 
 logger = logging.getLogger("genie")
 
-HEADERS = {"User-Agent": "genie-agent/1.0 (+https://example.local)"}
+# keep-alive is the httpx default, but be explicit: the shared client
+# relies on it to reuse connections across calls. Advertising gzip/br
+# shrinks text payloads severalfold; the client decompresses
+# transparently, so size limits still apply to decoded bytes.
+HEADERS = {
+    "User-Agent": "genie-agent/1.0 (+https://example.local)",
+    "Connection": "keep-alive",
+    "Accept-Encoding": "gzip, br",
+    "Accept": "text/html,application/json;q=0.9,*/*;q=0.1",
+}
+
+# DNS results are cached per TTL window so repeated fetches to the same
+# host skip the blocking lookup. The time bucket is part of the cache key,
+# which expires entries without any explicit purging.
+_DNS_TTL_SECONDS = 60
+
+@functools.lru_cache(maxsize=1024)
+def _resolve_addrs(hostname: str, ttl_bucket: int) -> tuple:
+    """Resolve hostname to all its IPv4/IPv6 addresses."""
+    infos = socket.getaddrinfo(hostname, None, type=socket.SOCK_STREAM)
+    return tuple({info[4][0] for info in infos})
 
 # Simple SSRF protection: block private/local IPs
 def is_private_ip(hostname: str) -> bool:
-    """Check if hostname resolves to a private IP address."""
+    """Check if hostname resolves to any private/local IP address."""
+    ttl_bucket = int(time.monotonic() // _DNS_TTL_SECONDS)
     try:
-        import socket
-        ip = socket.gethostbyname(hostname)
-        addr = ip_address(ip)
-        return addr.is_private or addr.is_loopback or addr.is_link_local
-    except (socket.gaierror, ValueError):
+        addrs = _resolve_addrs(hostname, ttl_bucket)
+    except socket.gaierror:
         return False
+    for ip in addrs:
+        try:
+            addr = ip_address(ip)
+        except ValueError:
+            continue
+        if (addr.is_private or addr.is_loopback or addr.is_link_local
+                or addr.is_reserved or addr.is_multicast):
+            return True
+    return False
+
+# Short-lived result caches. An agent session often re-issues the same
+# query across loop iterations; serving those from memory avoids redundant
+# egress and Reddit rate-limit 429s. All access happens on the event loop,
+# so no locking is needed.
+_REDDIT_CACHE = TTLCache(maxsize=512, ttl=60)
+_FETCH_CACHE = TTLCache(maxsize=64, ttl=30)
 
-def reddit_search(query: str, limit: int = 5) -> list:
+_REDDIT_SEARCH_URL = "https://www.reddit.com/search.json"
+
+async def reddit_search(query: str, limit: int = 5, use_cache: bool = True) -> list:
     """
     Search Reddit posts.
     Note: Reddit's public JSON API is deprecated and may be rate-limited.
     For production, use Reddit's OAuth API.
     """
-    url = f"https://www.reddit.com/search.json?q={quote(query)}&limit={limit}"
+    cache_key = (query.lower().strip(), limit)
+    if use_cache:
+        cached = _REDDIT_CACHE.get(cache_key)
+        if cached is not None:
+            return cached
     try:
-        r = requests.get(url, headers=HEADERS, timeout=10)
+        # Let the client urlencode the query; handles &, = and unicode
+        # correctly and keeps one stable URL for connection reuse.
+        r = await get_client().get(
+            _REDDIT_SEARCH_URL,
+            params={"q": query, "limit": limit},
+            headers=HEADERS,
+            timeout=10,
+        )
         r.raise_for_status()
         data = r.json()
         posts = []
@@ -39,53 +94,97 @@ def reddit_search(query: str, limit: int = 5) -> list:
                 "permalink": "https://reddit.com" + d.get("permalink", ""),
                 "selftext": d.get("selftext", "")[:500],  # Limit text length
             })
+        if posts:  # don't cache empty/failed lookups
+            _REDDIT_CACHE[cache_key] = posts
         return posts
-    except requests.RequestException as e:
+    except httpx.HTTPError as e:
         logger.warning(f"Reddit search failed: {e}")
         return []
     except (KeyError, ValueError) as e:
         logger.warning(f"Failed to parse Reddit response: {e}")
         return []
 
-def web_fetch(url: str, max_bytes: int = 200_000) -> str:
+# Cap on extracted text: anything longer mostly burns LLM context tokens.
+_MAX_TEXT_CHARS = 8000
+
+def _html_to_text(html: str) -> str:
+    """Extract readable text from HTML, dropping markup, scripts and styles."""
+    tree = HTMLParser(html)
+    for node in tree.css("script,style"):
+        node.decompose()
+    body = tree.body
+    text = body.text(separator=" ", strip=True) if body is not None else tree.text(separator=" ", strip=True)
+    text = re.sub(r"\s+", " ", text).strip()
+    return text[:_MAX_TEXT_CHARS]
+
+async def web_fetch(url: str, max_bytes: int = 200_000, use_cache: bool = True, raw: bool = False, max_chars: int = None) -> str:
     """
     Fetch content from a URL with size limits and basic SSRF protection.
+    HTML responses are reduced to readable text (raw=True returns the
+    unprocessed body) so the LLM isn't fed hundreds of KB of markup.
+    Callers that only keep the first max_chars characters can pass it so
+    fetching and decoding stop early instead of processing bytes that
+    would be thrown away.
     """
+    cache_key = (url, max_bytes, raw, max_chars)
+    if use_cache:
+        cached = _FETCH_CACHE.get(cache_key)
+        if cached is not None:
+            return cached
     parsed = urlparse(url)
     if not parsed.scheme or parsed.scheme not in ("http", "https"):
         raise ValueError("Only http/https URLs are allowed")
-    
-    # Basic SSRF protection
+
+    # Basic SSRF protection (DNS lookup is blocking, so run it off-loop)
     hostname = parsed.hostname
-    if hostname and is_private_ip(hostname):
+    if hostname and await asyncio.to_thread(is_private_ip, hostname):
         raise ValueError(f"Private IP addresses are not allowed: {hostname}")
-    
+
     try:
-        r = requests.get(url, headers=HEADERS, timeout=10, stream=True, allow_redirects=True)
-        r.raise_for_status()
-        content_type = r.headers.get("Content-Type", "").lower()
-        
-        # Skip binary content types
-        if content_type and not any(ct in content_type for ct in ["text", "json", "xml", "html"]):
-            logger.warning(f"Skipping non-text content type: {content_type}")
-            return f"[Content type {content_type} not processed]"
-        
-        chunks = []
-        total = 0
-        for chunk in r.iter_content(chunk_size=8192):
-            if not chunk:
-                break
-            total += len(chunk)
-            if total > max_bytes:
-                logger.warning(f"Content truncated at {max_bytes} bytes")
-                break
-            chunks.append(chunk)
-        
-        content = b"".join(chunks).decode(errors="replace")
+        async with get_client().stream(
+            "GET", url, headers=HEADERS, timeout=10, follow_redirects=True
+        ) as r:
+            r.raise_for_status()
+            content_type = r.headers.get("Content-Type", "").lower()
+
+            # Skip binary content types
+            if content_type and not any(ct in content_type for ct in ["text", "json", "xml", "html"]):
+                logger.warning(f"Skipping non-text content type: {content_type}")
+                return f"[Content type {content_type} not processed]"
+
+            # max_chars only bounds the download when output length tracks
+            # input length, i.e. no HTML extraction will run. HTML pages
+            # are mostly tags/scripts, so their first bytes yield far fewer
+            # text chars and the full max_bytes budget must stay available.
+            byte_budget = max_bytes
+            if max_chars is not None and (raw or "html" not in content_type):
+                # UTF-8 needs at most 4 bytes per character
+                byte_budget = min(max_bytes, max_chars * 4)
+
+            # Accumulate into a preallocated buffer: one copy per chunk and
+            # no per-chunk list objects, versus append + b"".join which
+            # copies the whole body a second time.
+            buf = bytearray(byte_budget)
+            total = 0
+            async for chunk in r.aiter_bytes(chunk_size=65536):
+                if not chunk:
+                    break
+                take = chunk[:byte_budget - total]
+                buf[total:total + len(take)] = take
+                total += len(take)
+                if total >= byte_budget:
+                    logger.warning(f"Content truncated at {byte_budget} bytes")
+                    break
+
+        content = bytes(buf[:total]).decode(errors="replace")
+        if not raw and "html" in content_type:
+            content = _html_to_text(content)
+        if max_chars is not None:
+            content = content[:max_chars]
+        _FETCH_CACHE[cache_key] = content
         return content
-    except requests.RequestException as e:
+    except httpx.HTTPError as e:
         logger.error(f"web_fetch request failed: {e}")
         raise RuntimeError(f"web_fetch failed: {e}")
     except ValueError as e:
         raise  # Re-raise validation errors
-